@@ -1,20 +1,261 @@
 import os
 import sys
 import argparse
+import asyncio
+import hashlib
 import json
+import pickle
+import warnings
+import faiss
+import numpy as np
+from pathlib import Path
+from typing import Any
 from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.document_loaders import TextLoader
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain.prompts import ChatPromptTemplate
+from langchain.retrievers import ContextualCompressionRetriever
+from langchain.retrievers.document_compressors.base import BaseDocumentCompressor
+from langchain.storage import LocalFileStore
 import cohere
 
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:
+    CrossEncoder = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
 # Load environment variables
 load_dotenv()
 
+# Dimensionality of OpenAI text-embedding vectors
+EMBEDDING_DIM = 1536
+
+# Static instructions sent as the first message every turn. Keeping this
+# prefix byte-identical across turns lets the provider's automatic
+# prompt caching reuse its prefill instead of recomputing it.
+SYSTEM_PROMPT = """You are a knowledgeable AI assistant that answers questions based on the provided documents.
+
+Guidelines for crafting your answer:
+- Use only the provided document context to answer; if context is insufficient, honestly say "I don't know" and offer general guidance.
+- Keep responses clear, conversational, and free of unnecessary jargon.
+- When explaining complex concepts, use examples or analogies."""
+
+# Index tiering by corpus size: below HNSW_THRESHOLD chunks an
+# exhaustive flat scan is already fast; above it an HNSW graph gives
+# 20-100x faster search with near-perfect recall; for very large
+# corpora IVF+PQ adds sub-linear search with compact codes.
+HNSW_THRESHOLD = 2048
+IVF_PQ_THRESHOLD = 100_000
+
+# Large-corpus factory recipe: OPQ rotation into 128 dims, IVF with 256
+# lists, 32-byte PQ codes — 32 B/chunk versus 6 KB of raw float32, so
+# scanning an inverted list touches ~192x less memory
+IVF_PQ_FACTORY = "OPQ32_128,IVF256,PQ32"
+
+# HNSW parameters: 32 neighbors per node, generous construction beam,
+# efSearch=64 comfortably covers k=50 retrieval
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Parallelize index construction and batch searches across all cores
+faiss.omp_set_num_threads(os.cpu_count())
+
+# Chunking parameters for transcript splitting
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+# How many texts to send per embeddings HTTP request (OpenAI allows
+# up to 2048 inputs per call; 256 keeps requests well under the token cap)
+EMBED_BATCH_SIZE = 256
+
+
+# On-disk embedding cache so re-loading a transcript or repeating a
+# query never re-embeds text that has been embedded before
+EMBED_CACHE_DIR = "./emb_cache"
+
+
+def _build_vectorstore(**kwargs):
+    """Construct the langchain FAISS wrapper for normalized-IP search.
+
+    normalize_L2 alongside MAX_INNER_PRODUCT is deliberate — vectors are
+    unit-normalized so inner product is cosine — but the constructor
+    warns about the combination, so that warning is silenced here.
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings(
+            "ignore", message="Normalizing L2 is not applicable"
+        )
+        return FAISS(
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+            normalize_L2=True,
+            **kwargs
+        )
+
+
+def _split_text_soa(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split text into overlapping chunks as two parallel lists (SoA).
+
+    One slicing pass yields the chunk strings and their character offsets
+    directly, instead of allocating a Document per chunk and then walking
+    them again to pull out .page_content for embedding.
+    """
+    if not text:
+        return [], []
+    step = size - overlap
+    offsets = list(range(0, max(len(text) - overlap, 1), step))
+    return [text[o:o + size] for o in offsets], offsets
+
+
+def _build_embeddings():
+    """Create the embedding model with explicit batching and retry settings.
+
+    The model is wrapped in a CacheBackedEmbeddings backed by a local file
+    store, keyed on a hash of (namespace, text), so both chunk and query
+    embeddings persist across runs.
+    """
+    base = OpenAIEmbeddings(chunk_size=EMBED_BATCH_SIZE, max_retries=3)
+    store = LocalFileStore(EMBED_CACHE_DIR)
+    return CacheBackedEmbeddings.from_bytes_store(
+        base, store, namespace=base.model, query_embedding_cache=True
+    )
+
+
+# Adaptive retrieval: from CANDIDATE_K raw candidates, keep only chunks
+# whose cosine similarity clears the threshold (capped at ADAPTIVE_MAX_K)
+# so off-topic chunks never reach the reranker or the prompt; if fewer
+# than ADAPTIVE_MIN_K clear it, fall back to a plain top-k cut
+CANDIDATE_K = 50
+SCORE_THRESHOLD = 0.3
+ADAPTIVE_MAX_K = 20
+ADAPTIVE_MIN_K = 5
+ADAPTIVE_FALLBACK_K = 10
+
+# Local cross-encoder used for reranking; scoring ~10 (query, chunk)
+# pairs takes a few ms on CPU versus a full HTTPS round trip to Cohere
+RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Semantic response cache: a repeat query whose embedding has cosine
+# similarity >= this threshold to a past query reuses the past answer
+QCACHE_SIMILARITY_THRESHOLD = 0.95
+QCACHE_MAX_ENTRIES = 128
+
+
+class _MicroBatcher:
+    """Coalesce concurrent requests into one batched backend call.
+
+    Items submitted within a short window are drained together (up to
+    max_batch at a time) and passed to batch_fn as a single list; each
+    caller receives its own result through a per-request future. With one
+    interactive user this adds at most max_wait of latency, but under
+    concurrent load N queries cost one backend call instead of N.
+    """
+
+    def __init__(self, batch_fn, max_batch=32, max_wait=0.02):
+        self._batch_fn = batch_fn
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue = asyncio.Queue()
+        self._drain_task = None
+
+    async def submit(self, item):
+        """Queue one item and wait for its slice of the batched result."""
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.ensure_future(self._drain())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await self._batch_fn([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+class _AdaptiveRetriever(BaseRetriever):
+    """Retriever that keeps only chunks clearing a relevance threshold.
+
+    Instead of always forwarding a fixed k candidates, scored search
+    results are filtered by SCORE_THRESHOLD so only genuinely relevant
+    chunks flow on to reranking and the prompt; sparse matches fall back
+    to a plain top-k cut so the LLM always gets some context.
+    """
+
+    vectorstore: Any = None
+
+    def _select(self, docs_and_scores):
+        # Scores here are raw inner products — cosine similarity, since
+        # vectors are normalized — where higher means more relevant.
+        # (similarity_search_with_relevance_scores would remap them to
+        # 1 - cosine under MAX_INNER_PRODUCT, inverting the ordering.)
+        keep = [doc for doc, score in docs_and_scores
+                if score >= SCORE_THRESHOLD]
+        if len(keep) < ADAPTIVE_MIN_K:
+            return [doc for doc, _ in docs_and_scores[:ADAPTIVE_FALLBACK_K]]
+        return keep[:ADAPTIVE_MAX_K]
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self._select(
+            self.vectorstore.similarity_search_with_score(
+                query, k=CANDIDATE_K
+            )
+        )
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        return self._select(
+            await self.vectorstore.asimilarity_search_with_score(
+                query, k=CANDIDATE_K
+            )
+        )
+
+
+class _RerankCompressor(BaseDocumentCompressor):
+    """Expose the chatbot's reranker as a retriever document compressor.
+
+    This lets the rerank step run inside the retrieval chain, so each
+    turn retrieves and embeds the query exactly once.
+    """
+
+    chatbot: Any = None
+    top_n: int = 15
+
+    def compress_documents(self, documents, query, callbacks=None):
+        documents = list(documents)
+        if self.chatbot.reranker is not None:
+            return self.chatbot._rerank_local(query, documents, self.top_n)
+        return documents[:self.top_n]
+
+    async def acompress_documents(self, documents, query, callbacks=None):
+        return await self.chatbot.rerank_results(query, list(documents), self.top_n)
+
+
 class SimpleRAGChatbot:
     def __init__(self):
         """Initialize the simple RAG chatbot without user context."""
@@ -22,18 +263,54 @@ class SimpleRAGChatbot:
         self.memory = None
         self.qa_chain = None
         self.vectorstore = None
-        
+        self.embeddings = None
+
+        # Semantic cache over past query embeddings (cosine via inner
+        # product on normalized vectors) mapping to cached responses
+        self._qcache_index = faiss.IndexFlatIP(EMBEDDING_DIM)
+        self._qcache_responses = []
+
+        # Shared Cohere client so concurrent reranks reuse one connection
+        self._cohere_client = None
+
+        # GPU resources must outlive any index moved onto the device
+        self._gpu_resources = None
+
         # Initialize components
         self._initialize_components()
+
+        # Fan concurrent query embeddings into one embeddings request
+        self._embed_batcher = _MicroBatcher(self.embeddings.aembed_documents)
     
     def _initialize_components(self):
         """Initialize all necessary components for the chatbot."""
         try:
-            # Initialize OpenAI LLM
-            self.llm = ChatOpenAI(temperature=0.7)
-            
-            # Create a conversation memory
-            self.memory = ConversationBufferMemory(
+            # Initialize OpenAI LLMs. The answer model is tagged so its
+            # stream events can be told apart from the utility model's,
+            # which handles question condensing and history summarization
+            # (neither of which should reach the user token-by-token).
+            self.llm = ChatOpenAI(temperature=0.7, tags=["answer"])
+            self.utility_llm = ChatOpenAI(temperature=0)
+
+            # Shared embedding model (also used for the semantic query cache)
+            self.embeddings = _build_embeddings()
+
+            # Local cross-encoder reranker; falls back to the Cohere API
+            # when sentence-transformers is not installed
+            self.reranker = None
+            if CrossEncoder is not None:
+                device = None
+                if torch is not None and torch.cuda.is_available():
+                    device = "cuda"
+                self.reranker = CrossEncoder(RERANKER_MODEL, device=device)
+
+
+            # Create a conversation memory; old turns are summarized once
+            # the buffer passes the token limit, so prompt size stays
+            # bounded no matter how long the session runs
+            self.memory = ConversationSummaryBufferMemory(
+                llm=self.utility_llm,
+                max_token_limit=1500,
                 memory_key="chat_history",
                 return_messages=True
             )
@@ -41,8 +318,14 @@ class SimpleRAGChatbot:
             # Create the conversation chain if vectorstore exists
             if os.path.exists("faiss_index") and os.listdir("faiss_index"):
                 print("Loading existing vector store...")
-                self.vectorstore = FAISS.load_local("faiss_index", OpenAIEmbeddings(), 
-                                                   allow_dangerous_deserialization=True)
+                self.vectorstore = self._load_vectorstore("faiss_index")
+                # IVF indexes need nprobe set after deserialization
+                # (extract_index_ivf sees through the OPQ pre-transform)
+                try:
+                    faiss.extract_index_ivf(self.vectorstore.index).nprobe = 8
+                except RuntimeError:
+                    pass
+                self.vectorstore.index = self._maybe_to_gpu(self.vectorstore.index)
                 self._setup_qa_chain()
             
             print("Simple RAG Chatbot initialized successfully!")
@@ -56,61 +339,146 @@ class SimpleRAGChatbot:
             print("Vector store not available. Please add a document first.")
             return
         
-        # Simple prompt template
-        qa_prompt = PromptTemplate.from_template("""
-        You are a knowledgeable AI assistant that answers questions based on the provided documents.
-        
-        Guidelines for crafting your answer:
-        - Use only the provided document context to answer; if context is insufficient, honestly say "I don't know" and offer general guidance.
-        - Keep responses clear, conversational, and free of unnecessary jargon.
-        - When explaining complex concepts, use examples or analogies.
-        
-        Document Context:
-        {context}
-        
-        Conversation History:
-        {chat_history}
-        
-        User Question:
-        {question}
-        
-        Your Answer:
-        """)
+        # Static instructions first, per-turn content (context, history,
+        # question) last, so the cacheable prefix stays identical
+        qa_prompt = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
+            ("human", """Document Context:
+{context}
+
+Conversation History:
+{chat_history}
+
+User Question:
+{question}
+
+Your Answer:"""),
+        ])
         
-        retriever = self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 50}
+        # Retrieve a wide candidate set, keep only chunks that clear the
+        # relevance threshold, then compress with the reranker — all
+        # inside the chain so retrieval happens exactly once
+        retriever = ContextualCompressionRetriever(
+            base_compressor=_RerankCompressor(chatbot=self, top_n=15),
+            base_retriever=_AdaptiveRetriever(vectorstore=self.vectorstore)
         )
-        
+
         self.qa_chain = ConversationalRetrievalChain.from_llm(
             llm=self.llm,
+            condense_question_llm=self.utility_llm,
             retriever=retriever,
             memory=self.memory,
             combine_docs_chain_kwargs={"prompt": qa_prompt}
         )
     
+    def _build_index(self, xb):
+        """Build a FAISS index sized to the corpus.
+
+        Small corpora get an exhaustive IndexFlatIP; medium corpora get an
+        HNSW graph, whose greedy search visits only a tiny neighborhood of
+        the graph per query; very large corpora switch to IVF256+PQ32,
+        which searches a few inverted lists and stores OPQ-rotated 32-byte
+        PQ codes instead of full float32 vectors — since flat search is
+        memory-bound, the smaller codes speed up scanning near-linearly.
+        """
+        d = xb.shape[1]
+        if len(xb) < HNSW_THRESHOLD:
+            index = faiss.IndexFlatIP(d)
+        elif len(xb) < IVF_PQ_THRESHOLD:
+            index = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        else:
+            index = faiss.index_factory(d, IVF_PQ_FACTORY, faiss.METRIC_INNER_PRODUCT)
+            index.train(xb)
+            faiss.extract_index_ivf(index).nprobe = 8
+        index.add(xb)
+        return index
+
+    def _load_vectorstore(self, folder):
+        """Load a saved vector store, memory-mapping the index.
+
+        FAISS.load_local would eagerly read the whole index file into
+        RAM, so instead the raw index is opened with IO_FLAG_MMAP — the
+        OS faults pages in on demand and startup doesn't block on the
+        full file — and combined with the docstore and id mapping that
+        save_local pickled alongside it. Index types without mmap
+        support fall back to a plain read.
+        """
+        index_path = os.path.join(folder, "index.faiss")
+        try:
+            index = faiss.read_index(
+                index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+        except RuntimeError:
+            index = faiss.read_index(index_path)
+        with open(os.path.join(folder, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return _build_vectorstore(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id
+        )
+
+    def _maybe_to_gpu(self, index):
+        """Move a CPU index to GPU 0 when faiss-gpu and a device exist.
+
+        HNSW has no GPU implementation in faiss, so those indexes (and any
+        other unsupported type) are returned unchanged.
+        """
+        if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+            return index
+        try:
+            if self._gpu_resources is None:
+                self._gpu_resources = faiss.StandardGpuResources()
+            return faiss.index_cpu_to_gpu(self._gpu_resources, 0, index)
+        except Exception as e:
+            print(f"Could not move index to GPU, staying on CPU: {e}")
+            return index
+
     def load_document(self, filepath):
         """Load a document to be used for RAG."""
         try:
             print(f"Loading document from {filepath}...")
             
-            # Load the document
-            loader = TextLoader(filepath)
-            documents = loader.load()
-            
-            # Split into chunks
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-            texts = text_splitter.split_documents(documents)
-            
-            print(f"Split document into {len(texts)} chunks")
-            
-            # Create embeddings and vector store
-            embeddings = OpenAIEmbeddings()
-            self.vectorstore = FAISS.from_documents(texts, embeddings)
+            # Load and split in one pass: chunk strings plus offsets,
+            # no intermediate Document objects
+            text = Path(filepath).read_text(encoding="utf-8")
+            chunk_texts, offsets = _split_text_soa(text)
+
+            print(f"Split document into {len(chunk_texts)} chunks")
+
+            # Create embeddings and vector store; embed_documents batches
+            # EMBED_BATCH_SIZE texts per HTTP request instead of one-by-one
+            vectors = self.embeddings.embed_documents(chunk_texts)
+            xb = np.asarray(vectors, dtype="float32")
+            # Normalize once on ingest so inner product equals cosine;
+            # the IP kernel skips the subtract/square work of L2
+            faiss.normalize_L2(xb)
+
+            index = self._build_index(xb)
+            docstore = InMemoryDocstore({
+                str(i): Document(
+                    page_content=chunk,
+                    metadata={"source": filepath, "start": offset}
+                )
+                for i, (chunk, offset) in enumerate(zip(chunk_texts, offsets))
+            })
+            index_to_docstore_id = {i: str(i) for i in range(len(chunk_texts))}
+            self.vectorstore = _build_vectorstore(
+                embedding_function=self.embeddings,
+                index=index,
+                docstore=docstore,
+                index_to_docstore_id=index_to_docstore_id
+            )
             
-            # Save the vector store
+            # Save the vector store (CPU form), then move it to GPU if one
+            # is available for faster search
             self.vectorstore.save_local("faiss_index")
-            
+            self.vectorstore.index = self._maybe_to_gpu(self.vectorstore.index)
+
+
             # Set up the QA chain
             self._setup_qa_chain()
             
@@ -120,20 +488,34 @@ class SimpleRAGChatbot:
             print(f"Error loading document: {e}")
             return False
     
-    def rerank_results(self, query, results, k=15):
-        """Use Cohere to rerank the search results."""
+    def _rerank_local(self, query, results, k):
+        """Score (query, chunk) pairs with the local cross-encoder."""
+        scores = self.reranker.predict(
+            [(query, doc.page_content) for doc in results]
+        )
+        order = np.argsort(-np.asarray(scores))[:k]
+        return [results[i] for i in order]
+
+    async def rerank_results(self, query, results, k=15):
+        """Rerank search results, preferring the local cross-encoder."""
         try:
+            if self.reranker is not None:
+                # CPU-bound model inference; keep it off the event loop
+                return await asyncio.to_thread(self._rerank_local, query, results, k)
+
             if "CO_API_KEY" not in os.environ:
                 print("Cohere API key not found. Skipping reranking.")
                 return results[:k]
-                
-            co = cohere.ClientV2(os.getenv("CO_API_KEY"))
-            
+
+            if self._cohere_client is None:
+                self._cohere_client = cohere.AsyncClientV2(os.getenv("CO_API_KEY"))
+            co = self._cohere_client
+
             # Extract text from documents for reranking
             docs_content = [doc.page_content for doc in results]
-            
+
             # Rerank with Cohere
-            response = co.rerank(
+            response = await co.rerank(
                 model="rerank-v3.5",
                 query=query,
                 documents=docs_content,
@@ -151,66 +533,120 @@ class SimpleRAGChatbot:
             print(f"Error in reranking: {e}")
             return results[:k]  # Fall back to regular results if reranking fails
     
-    def chat(self, user_input):
-        """Process user input and return a response."""
-        if not self.vectorstore:
-            return "I'm not ready yet. Please load a document first."
-        
-        try:
-            # Get raw results from vector store
-            raw_results = self.vectorstore.similarity_search(user_input, k=10)
-            
-            # Rerank results with Cohere
-            reranked_docs = self.rerank_results(user_input, raw_results)
-            
-            # Extract context from reranked documents
-            context = "\n\n".join([doc.page_content for doc in reranked_docs])
-            
-            # Get chat history
-            chat_history = []
-            if self.memory and hasattr(self.memory, "chat_memory"):
-                chat_history = self.memory.chat_memory.messages
-            
-            # Format chat history for prompt
-            formatted_history = ""
-            if chat_history:
-                for msg in chat_history:
-                    if hasattr(msg, "type") and hasattr(msg, "content"):
-                        role = "Human" if msg.type == "human" else "Assistant"
-                        formatted_history += f"{role}: {msg.content}\n"
-            
-            # Create a custom prompt
-            prompt = f"""
-            Based on the following context and conversation history, please answer the user's question.
-            Be conversational, helpful, and accurate. If the context doesn't contain relevant information,
-            acknowledge this and try to provide general guidance.
-            
-            Context:
-            {context}
-            
-            Conversation History:
-            {formatted_history}
-            
-            User Question: {user_input}
-            
-            Answer:
-            """
-            
-            # Get response from LLM
-            response = self.llm.predict(prompt)
-            
-            # Update memory
-            self.memory.save_context(
-                {"input": user_input}, 
-                {"output": response}
+    async def _embed_query_normed(self, user_input):
+        """Embed a query and L2-normalize it for cosine comparison.
+
+        Goes through the micro-batcher so concurrent queries share one
+        embeddings request.
+        """
+        vec = np.asarray([await self._embed_batcher.submit(user_input)],
+                         dtype="float32")
+        faiss.normalize_L2(vec)
+        return vec
+
+    def _history_fingerprint(self):
+        """Hash the current conversation state.
+
+        Follow-up questions like "explain that in more detail" embed
+        identically regardless of what "that" refers to, so cached
+        answers are only reused when the history they were produced
+        against matches too.
+        """
+        if not self.memory:
+            return ""
+        parts = [getattr(self.memory, "moving_summary_buffer", "")]
+        parts += [f"{msg.type}:{msg.content}"
+                  for msg in self.memory.chat_memory.messages]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _qcache_lookup(self, query_vec, fingerprint):
+        """Return a cached response for a near-duplicate past query asked
+        against the same conversation history, or None."""
+        if self._qcache_index.ntotal == 0:
+            return None
+        D, I = self._qcache_index.search(query_vec, 1)
+        if D[0][0] >= QCACHE_SIMILARITY_THRESHOLD:
+            cached_fingerprint, response = self._qcache_responses[I[0][0]]
+            if cached_fingerprint == fingerprint:
+                return response
+        return None
+
+    def _qcache_add(self, query_vec, fingerprint, response):
+        """Cache a response under its query embedding, evicting the oldest."""
+        if len(self._qcache_responses) >= QCACHE_MAX_ENTRIES:
+            # Rebuild without the oldest half; IndexFlatIP has no cheap
+            # in-place removal, and the cache is small enough to recreate
+            keep = QCACHE_MAX_ENTRIES // 2
+            kept_vecs = self._qcache_index.reconstruct_n(
+                self._qcache_index.ntotal - keep, keep
             )
-            
+            self._qcache_index.reset()
+            self._qcache_index.add(kept_vecs)
+            self._qcache_responses = self._qcache_responses[-keep:]
+        self._qcache_index.add(query_vec)
+        self._qcache_responses.append((fingerprint, response))
+
+    async def chat(self, user_input, on_token=None):
+        """Process user input and return a response.
+
+        When on_token is provided it receives each answer token as it is
+        generated, so callers can render the response incrementally
+        instead of waiting for the full generation. Responses that never
+        hit the LLM (cache hits, errors) are delivered to on_token whole.
+        """
+        if not self.qa_chain:
+            response = "I'm not ready yet. Please load a document first."
+            if on_token:
+                on_token(response)
+            return response
+
+        try:
+            # Short-circuit on a semantically near-duplicate past query,
+            # but only when asked against the same conversation history
+            fingerprint = self._history_fingerprint()
+            query_vec = await self._embed_query_normed(user_input)
+            cached = self._qcache_lookup(query_vec, fingerprint)
+            if cached is not None:
+                # Record the turn so history stays consistent even though
+                # the chain (which normally updates memory) was skipped
+                self.memory.save_context(
+                    {"input": user_input},
+                    {"output": cached}
+                )
+                if on_token:
+                    on_token(cached)
+                return cached
+
+            # The chain retrieves, reranks (via the compression retriever),
+            # prompts the LLM, and updates memory — each exactly once
+            if on_token is None:
+                result = await self.qa_chain.ainvoke({"question": user_input})
+                response = result["answer"]
+            else:
+                # Forward only the tagged answer model's tokens; the
+                # utility model's condense/summary output stays internal
+                tokens = []
+                async for event in self.qa_chain.astream_events(
+                        {"question": user_input}, version="v2"):
+                    if (event["event"] == "on_chat_model_stream"
+                            and "answer" in event.get("tags", [])):
+                        token = event["data"]["chunk"].content
+                        if token:
+                            on_token(token)
+                            tokens.append(token)
+                response = ''.join(tokens)
+
+            self._qcache_add(query_vec, fingerprint, response)
+
             return response
         except Exception as e:
             print(f"Error in chat: {e}")
-            return "I encountered an error processing your request. Please try again."
+            response = "I encountered an error processing your request. Please try again."
+            if on_token:
+                on_token(response)
+            return response
 
-def main():
+async def main():
     """Main function to run the chatbot in interactive mode."""
     # Set up argument parsing
     parser = argparse.ArgumentParser(description='Simple RAG Chatbot with document loading')
@@ -247,8 +683,12 @@ def main():
             print("Goodbye!")
             break
         
-        response = chatbot.chat(user_input)
-        print(f"\nChatbot: {response}")
+        print("\nChatbot: ", end="", flush=True)
+        await chatbot.chat(
+            user_input,
+            on_token=lambda token: print(token, end="", flush=True)
+        )
+        print()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    asyncio.run(main())
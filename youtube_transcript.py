@@ -1,18 +1,19 @@
 import os
 import argparse
+import re
+import numpy as np
 from youtube_transcript_api import YouTubeTranscriptApi, _errors
 
+# Matches the 11-character video ID in watch, youtu.be, and shorts URLs
+_VIDEO_ID_RE = re.compile(r'(?:v=|youtu\.be/|/shorts/)([A-Za-z0-9_-]{11})')
+
 def extract_video_id(youtube_url):
     """Extract the video ID from a YouTube URL."""
-    if "youtu.be" in youtube_url:
-        return youtube_url.split("/")[-1].split("?")[0]
-    elif "youtube.com/watch" in youtube_url:
-        import urllib.parse as urlparse
-        parsed_url = urlparse.urlparse(youtube_url)
-        return urlparse.parse_qs(parsed_url.query)['v'][0]
-    else:
-        # If the input is just the ID
-        return youtube_url
+    match = _VIDEO_ID_RE.search(youtube_url)
+    if match:
+        return match.group(1)
+    # If the input is just the ID
+    return youtube_url
 
 def get_transcript(video_id, languages=['en']):
     """Get transcript for a YouTube video."""
@@ -37,23 +38,46 @@ def format_transcript(transcript, format_type='text'):
     if format_type == 'text':
         return '\n'.join([item['text'] for item in transcript])
     elif format_type == 'srt':
-        srt_content = ""
-        for i, item in enumerate(transcript, 1):
-            start_seconds = item['start']
-            duration = item.get('duration', 0)
-            end_seconds = start_seconds + duration
-            
-            start_time = format_time(start_seconds)
-            end_time = format_time(end_seconds)
-            
-            srt_content += f"{i}\n{start_time} --> {end_time}\n{item['text']}\n\n"
-        return srt_content
+        return ''.join(iter_srt_cues(transcript))
     elif format_type == 'json':
         import json
         return json.dumps(transcript, indent=2)
     else:
         return '\n'.join([item['text'] for item in transcript])
 
+def iter_srt_cues(transcript):
+    """Yield formatted SRT cues one at a time.
+
+    Cue times are still computed in one vectorized pass (format_times);
+    yielding per cue lets callers stream straight to disk instead of
+    building the whole SRT document in memory first.
+    """
+    count = len(transcript)
+    starts = np.fromiter((item['start'] for item in transcript),
+                         dtype=np.float64, count=count)
+    durations = np.fromiter((item.get('duration', 0) for item in transcript),
+                            dtype=np.float64, count=count)
+    start_times = format_times(starts)
+    end_times = format_times(starts + durations)
+    for i, (start, end, item) in enumerate(
+            zip(start_times, end_times, transcript), 1):
+        yield f"{i}\n{start} --> {end}\n{item['text']}\n\n"
+
+def format_times(seconds):
+    """Format an array of times into SRT "HH:MM:SS,mmm" strings.
+
+    The hour/minute/second/millisecond fields are derived with vectorized
+    integer arithmetic (truncating like format_time does) so the Python
+    loop only does string formatting.
+    """
+    total_ms = (np.asarray(seconds) * 1000).astype(np.int64)
+    hours = total_ms // 3_600_000
+    minutes = (total_ms % 3_600_000) // 60_000
+    secs = (total_ms % 60_000) // 1000
+    millis = total_ms % 1000
+    return [f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+            for h, m, s, ms in zip(hours, minutes, secs, millis)]
+
 def format_time(seconds):
     """Format seconds into SRT time format: HH:MM:SS,mmm"""
     hours = int(seconds / 3600)
@@ -64,10 +88,19 @@ def format_time(seconds):
     return f"{hours:02d}:{minutes:02d}:{int(seconds):02d},{milliseconds:03d}"
 
 def save_transcript(content, output_file):
-    """Save the transcript content to the specified file."""
+    """Save transcript content to the specified file.
+
+    Accepts either a complete string or an iterable of string pieces;
+    pieces are written incrementally so the full document never has to
+    be assembled in memory.
+    """
     try:
         with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(content)
+            if isinstance(content, str):
+                f.write(content)
+            else:
+                for piece in content:
+                    f.write(piece)
         print(f"Transcript saved to {output_file}")
         return True
     except Exception as e:
@@ -93,9 +126,13 @@ def main():
     transcript = get_transcript(video_id, args.language)
     
     if transcript:
-        # Format transcript
-        content = format_transcript(transcript, args.format)
-        
+        # Format transcript; SRT output streams cue-by-cue to the file
+        if args.format == 'srt':
+            content = iter_srt_cues(transcript)
+        else:
+            content = format_transcript(transcript, args.format)
+
+
         # Determine output file
         if args.output:
             output_file = args.output